@@ -1,9 +1,87 @@
 # Python Recap: Asynchronous Programming (asyncio)
 
 import asyncio
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
+import contextlib
+import functools
+import inspect
+import itertools
+import json
+import mmap
+import os
+import pickle
+import random
+import selectors
+import statistics
+import struct
+import tempfile
 import time
+import tracemalloc
+import urllib.parse
+import zlib
 from typing import List
 
+# ===== VIRTUAL TIME (see example 43) =====
+# Run with ASYNC_RECAP_VIRTUAL_TIME=1 to put every example below on a virtual clock.
+# Whenever all tasks are waiting on timers, the clock jumps straight to the next
+# one, so sleeps cost no real time but still fire in exactly the same order.
+# While an executor job (threads, processes, to_thread) or a socket/pipe is still
+# outstanding the loop really waits and the clock follows real time, so a wait_for
+# around that work cannot time out early.
+class _VirtualSelector:
+    def __init__(self, selector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def select(self, timeout=None):
+        if self._loop._outside_work():
+            start = time.monotonic()
+            events = self._selector.select(timeout)
+            self._loop._virtual_now += time.monotonic() - start
+            return events
+        if timeout is None or timeout <= 0:
+            return self._selector.select(timeout)
+        events = self._selector.select(0)
+        if not events:
+            self._loop._virtual_now += timeout  # Jump to the next timer
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        self._virtual_now = 0.0
+        self._executor_jobs = 0
+        super().__init__(_VirtualSelector(selectors.DefaultSelector(), self))
+
+    def time(self):
+        return self._virtual_now
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self._executor_jobs += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, future):
+        self._executor_jobs -= 1
+
+    def _outside_work(self):
+        # Executor jobs, or any registered fd besides the loop's own wakeup pipe
+        return self._executor_jobs > 0 or any(
+            key.fd != self._ssock.fileno() for key in self._selector.get_map().values())
+
+class VirtualClockPolicy(asyncio.DefaultEventLoopPolicy):
+    def new_event_loop(self):
+        return VirtualClockLoop()
+
+if os.environ.get("ASYNC_RECAP_VIRTUAL_TIME"):
+    asyncio.set_event_loop_policy(VirtualClockPolicy())
+
 # ===== BASIC ASYNC/AWAIT =====
 
 # 1. Simple async function
@@ -14,8 +92,9 @@ async def example_1():
     result = await greet()
     print(f"1. Simple async function: {result}")
 
-asyncio.run(example_1())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_1())
+    print()
 
 # 2. async function with delay
 async def say_after(delay, message):
@@ -29,11 +108,12 @@ async def example_2():
     print(f"   {result}")
     print(f"   Time taken: {time.time() - start:.2f}s")
 
-asyncio.run(example_2())
-example_2() # will through error " coroutine 'example_2' was never awaited"
-# Because coroutine can't run except inside event loop
-# Coroutine is similar to JS promise but not similar, it just creates an object
-print()
+if __name__ == "__main__":
+    asyncio.run(example_2())
+    example_2() # will through error " coroutine 'example_2' was never awaited"
+    # Because coroutine can't run except inside event loop
+    # Coroutine is similar to JS promise but not similar, it just creates an object
+    print()
 
 # 3. Running multiple coroutines sequentially
 async def task_a():
@@ -52,8 +132,9 @@ async def example_3():
     print(f"   {result_a}, {result_b}")
     print(f"   Time taken: {time.time() - start:.2f}s (sequential)")
 
-asyncio.run(example_3())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_3())
+    print()
 
 # ===== CONCURRENT EXECUTION =====
 
@@ -73,8 +154,9 @@ async def example_4():
     print(f"   Results: {results}")
     print(f"   Time taken: {time.time() - start:.2f}s (concurrent)")
 
-asyncio.run(example_4())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_4())
+    print()
 
 # 5. asyncio.create_task() - schedule coroutines
 async def example_5():
@@ -96,8 +178,9 @@ async def example_5():
     print(f"   Results: {result1}, {result2}, {result3}")
     print(f"   Time taken: {time.time() - start:.2f}s")
 
-asyncio.run(example_5())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_5())
+    print()
 
 # 6. asyncio.wait() - wait for tasks with different strategies
 async def example_6():
@@ -118,8 +201,9 @@ async def example_6():
     for task in pending:
         task.cancel()
 
-asyncio.run(example_6())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_6())
+    print()
 
 # ===== ASYNC GENERATORS AND ITERATORS =====
 
@@ -134,8 +218,9 @@ async def example_7():
     async for num in async_counter(5):
         print(f"   Count: {num}")
 
-asyncio.run(example_7())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_7())
+    print()
 
 # 8. Async comprehension
 async def example_8():
@@ -143,8 +228,9 @@ async def example_8():
     results = [i async for i in async_counter(5)]
     print(f"   Results: {results}")
 
-asyncio.run(example_8())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_8())
+    print()
 
 # 9. Async iterator (custom)
 class AsyncRange:
@@ -168,11 +254,13 @@ async def example_9():
     async for num in AsyncRange(0, 5):
         print(f"   Number: {num}")
 
-asyncio.run(example_9())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_9())
+    print()
 
 # ===== ASYNC CONTEXT MANAGERS =====
-print("--- ASYNC CONTEXT MANAGERS ---\n")
+if __name__ == "__main__":
+    print("--- ASYNC CONTEXT MANAGERS ---\n")
 
 # 10. Async context manager
 class AsyncResource:
@@ -192,11 +280,13 @@ async def example_10():
     async with AsyncResource() as resource:
         print("   Using resource")
 
-asyncio.run(example_10())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_10())
+    print()
 
 # ===== ERROR HANDLING =====
-print("--- ERROR HANDLING ---\n")
+if __name__ == "__main__":
+    print("--- ERROR HANDLING ---\n")
 
 # 11. Exception handling in async
 async def failing_task():
@@ -210,8 +300,9 @@ async def example_11():
     except ValueError as e:
         print(f"   Caught exception: {e}")
 
-asyncio.run(example_11())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_11())
+    print()
 
 # 12. gather with return_exceptions
 async def task_that_fails():
@@ -235,11 +326,13 @@ async def example_12():
         else:
             print(f"   Task {i}: {result}")
 
-asyncio.run(example_12())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_12())
+    print()
 
 # ===== TIMEOUTS AND CANCELLATION =====
-print("--- TIMEOUTS AND CANCELLATION ---\n")
+if __name__ == "__main__":
+    print("--- TIMEOUTS AND CANCELLATION ---\n")
 
 # 13. asyncio.wait_for() with timeout
 async def long_task():
@@ -254,8 +347,9 @@ async def example_13():
     except asyncio.TimeoutError:
         print("   Task timed out!")
 
-asyncio.run(example_13())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_13())
+    print()
 
 # 14. Manual task cancellation
 async def cancellable_task():
@@ -277,11 +371,13 @@ async def example_14():
     except asyncio.CancelledError:
         print("   Confirmed: Task cancelled")
 
-asyncio.run(example_14())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_14())
+    print()
 
 # ===== SYNCHRONIZATION PRIMITIVES =====
-print("--- SYNCHRONIZATION PRIMITIVES ---\n")
+if __name__ == "__main__":
+    print("--- SYNCHRONIZATION PRIMITIVES ---\n")
 
 # 15. asyncio.Lock
 shared_resource = 0
@@ -301,8 +397,9 @@ async def example_15():
     await asyncio.gather(*[increment_with_lock() for _ in range(5)])
     print(f"   Final value: {shared_resource}")
 
-asyncio.run(example_15())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_15())
+    print()
 
 # 16. asyncio.Semaphore
 async def limited_task(sem, id):
@@ -316,8 +413,9 @@ async def example_16():
     sem = asyncio.Semaphore(2)  # Only 2 concurrent tasks
     await asyncio.gather(*[limited_task(sem, i) for i in range(5)])
 
-asyncio.run(example_16())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_16())
+    print()
 
 # 17. asyncio.Event
 async def waiter(event, name):
@@ -339,11 +437,13 @@ async def example_17():
         setter(event)
     )
 
-asyncio.run(example_17())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_17())
+    print()
 
 # ===== QUEUES =====
-print("--- QUEUES ---\n")
+if __name__ == "__main__":
+    print("--- QUEUES ---\n")
 
 # 18. asyncio.Queue
 async def producer(queue, id):
@@ -373,11 +473,13 @@ async def example_18():
     for c in consumers:
         c.cancel()
 
-asyncio.run(example_18())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_18())
+    print()
 
 # ===== RUNNING BLOCKING CODE =====
-print("--- RUNNING BLOCKING CODE ---\n")
+if __name__ == "__main__":
+    print("--- RUNNING BLOCKING CODE ---\n")
 
 # 19. run_in_executor() for CPU-bound tasks
 def blocking_io():
@@ -390,11 +492,13 @@ async def example_19():
     result = await loop.run_in_executor(None, blocking_io)
     print(f"   {result}")
 
-asyncio.run(example_19())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_19())
+    print()
 
 # ===== TASK GROUPS (Python 3.11+) =====
-print("--- TASK GROUPS (Python 3.11+) ---\n")
+if __name__ == "__main__":
+    print("--- TASK GROUPS (Python 3.11+) ---\n")
 
 # 20. TaskGroup for structured concurrency
 async def example_20():
@@ -407,11 +511,13 @@ async def example_20():
     except AttributeError:
         print("   TaskGroup not available (requires Python 3.11+)")
 
-asyncio.run(example_20())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_20())
+    print()
 
 # ===== ASYNC WITH CALLBACKS =====
-print("--- ASYNC WITH CALLBACKS ---\n")
+if __name__ == "__main__":
+    print("--- ASYNC WITH CALLBACKS ---\n")
 
 # 21. Futures and callbacks
 async def example_21():
@@ -427,11 +533,13 @@ async def example_21():
     future.set_result("Future result")
     await asyncio.sleep(0.1)  # Give callback time to execute
 
-asyncio.run(example_21())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_21())
+    print()
 
 # ===== PRACTICAL EXAMPLE: WEB SCRAPING SIMULATION =====
-print("--- PRACTICAL EXAMPLE ---\n")
+if __name__ == "__main__":
+    print("--- PRACTICAL EXAMPLE ---\n")
 
 # 22. Simulated concurrent web requests
 async def fetch_url(url, delay):
@@ -455,11 +563,13 @@ async def example_22():
     print(f"   Fetched {len(results)} URLs")
     print(f"   Time taken: {time.time() - start:.2f}s (vs ~5.5s sequential)")
 
-asyncio.run(example_22())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_22())
+    print()
 
 # ===== ASYNC CLASS METHODS =====
-print("--- ASYNC CLASS METHODS ---\n")
+if __name__ == "__main__":
+    print("--- ASYNC CLASS METHODS ---\n")
 
 # 23. Class with async methods
 class AsyncDatabase:
@@ -488,9 +598,2190 @@ async def example_23():
     result = await db.fetch("user1")
     print(f"   Fetched: {result}")
 
-asyncio.run(example_23())
-print()
+if __name__ == "__main__":
+    asyncio.run(example_23())
+    print()
+
+# ===== PERFORMANCE PATTERNS =====
+if __name__ == "__main__":
+    print("--- PERFORMANCE PATTERNS ---\n")
+
+# 24. Connection pool + batched insert_many/fetch_many
+# AsyncDatabase pays a full round-trip for every single key.
+# A pool keeps a bounded set of connections that acquire()/connection() hand out
+# again and again, and the *_many calls move many keys in one round-trip.
+class PooledConnection:
+    def __init__(self, db, conn_id):
+        self.db = db
+        self.conn_id = conn_id
+
+    async def round_trip(self):
+        await asyncio.sleep(self.db.latency)
+
+class PooledAsyncDatabase(AsyncDatabase):
+    def __init__(self, pool_size=4, latency=0.01):
+        super().__init__()
+        self.pool_size = pool_size
+        self.latency = latency
+        # LIFO of idle connections on top of None slots not opened yet, so an idle
+        # connection is always reused before a new one is opened
+        self._idle = asyncio.LifoQueue()
+        for _ in range(pool_size):
+            self._idle.put_nowait(None)
+        self._opened = 0
+        self._ids = itertools.count(1)
+
+    async def connect(self):
+        # Like AsyncDatabase.connect(): get ready, hand nothing out (warms one connection)
+        self.release(await self.acquire())
+
+    async def acquire(self):
+        conn = await self._idle.get()
+        if conn is None:
+            try:
+                conn = PooledConnection(self, next(self._ids))
+                await conn.round_trip()  # Handshake is paid once per connection
+            except BaseException:
+                self._idle.put_nowait(None)  # Give the slot back if the handshake fails
+                raise
+            self._opened += 1
+        return conn
+
+    def release(self, conn):
+        self._idle.put_nowait(conn)
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        conn = await self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
 
-print("="*60)
-print("END OF ASYNC PROGRAMMING CONCEPTS")
-print("="*60)
\ No newline at end of file
+    async def insert(self, key, value):
+        async with self.connection() as conn:
+            await conn.round_trip()
+            self.data[key] = value
+        return f"Inserted {key}"
+
+    async def fetch(self, key):
+        async with self.connection() as conn:
+            await conn.round_trip()
+            return self.data.get(key, "Not found")
+
+    async def insert_many(self, items):
+        async with self.connection() as conn:
+            await conn.round_trip()  # One trip for the whole batch
+            self.data.update(items)
+        return f"Inserted {len(items)} keys"
+
+    async def fetch_many(self, keys):
+        async with self.connection() as conn:
+            await conn.round_trip()
+            return [self.data.get(key, "Not found") for key in keys]
+
+async def bench_pool(concurrency, batch_size, n_keys=400):
+    db = PooledAsyncDatabase(pool_size=8, latency=0.002)
+    keys = [f"user{i}" for i in range(n_keys)]
+    chunks = [keys[i:i + batch_size] for i in range(0, n_keys, batch_size)]
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(chunk):
+        async with sem:
+            if batch_size == 1:
+                await db.insert(chunk[0], chunk[0].upper())
+            else:
+                await db.insert_many({key: key.upper() for key in chunk})
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*[run(chunk) for chunk in chunks])
+    return n_keys / (loop.time() - start)
+
+async def example_24():
+    print("24. Connection pool + batched calls:")
+    db = PooledAsyncDatabase(pool_size=2)
+    await db.connect()
+    await db.insert_many({"user1": "Alice", "user2": "Bob", "user3": "Carol"})
+    print(f"   fetch_many: {await db.fetch_many(['user1', 'user3', 'user9'])}")
+    print(f"   Connections opened: {db._opened} (pool size {db.pool_size})")
+
+    print("   Keys/sec (single vs batched of 50):")
+    for concurrency in [1, 8, 64]:
+        single = await bench_pool(concurrency, 1)
+        batched = await bench_pool(concurrency, 50)
+        print(f"   concurrency={concurrency:<3} single: {single:>8.0f}  batched: {batched:>8.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(example_24())
+    print()
+
+# 25. Secondary indexes + range queries
+# data is a plain dict, so anything but an exact-key fetch scans every value.
+# A sorted index answers range/prefix queries with two binary searches: O(log n + k).
+# A hash index maps a field value straight to the matching keys.
+class SortedIndex:
+    def __init__(self, field=None):
+        self.field = field  # None means "index the primary key itself"
+        self.entries = []   # Sorted list of (indexed value, primary key)
+
+    def _entry(self, key, value):
+        if self.field is None:
+            return (key, key)
+        if isinstance(value, dict) and self.field in value:
+            return (value[self.field], key)
+        return None
+
+    def add(self, key, value):
+        entry = self._entry(key, value)
+        if entry is not None:
+            bisect.insort(self.entries, entry)
+
+    def remove(self, key, value):
+        entry = self._entry(key, value)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+
+    def range(self, low, high):
+        # Inclusive on both ends
+        lo = bisect.bisect_left(self.entries, low, key=lambda e: e[0])
+        hi = bisect.bisect_right(self.entries, high, key=lambda e: e[0])
+        return [key for _, key in self.entries[lo:hi]]
+
+    def prefix(self, prefix):
+        return self.range(prefix, prefix + "\U0010ffff")
+
+class HashIndex:
+    def __init__(self, field):
+        self.field = field
+        self.buckets = {}  # field value -> set of primary keys
+
+    def add(self, key, value):
+        if isinstance(value, dict) and self.field in value:
+            self.buckets.setdefault(value[self.field], set()).add(key)
+
+    def remove(self, key, value):
+        if isinstance(value, dict) and self.field in value:
+            bucket = self.buckets.get(value[self.field])
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[value[self.field]]
+
+    def lookup(self, field_value):
+        return sorted(self.buckets.get(field_value, ()))
+
+class IndexedAsyncDatabase(AsyncDatabase):
+    def __init__(self):
+        super().__init__()
+        self.key_index = SortedIndex()  # Primary keys, kept apart so no field index can replace it
+        self.indexes = {}               # Index name -> secondary index on a field
+
+    def create_sorted_index(self, field, name=None):
+        return self._create_index(name or field, SortedIndex(field))
+
+    def create_hash_index(self, field, name=None):
+        return self._create_index(name or field, HashIndex(field))
+
+    def _create_index(self, name, index):
+        if name in self.indexes:
+            raise ValueError(f"Index {name!r} already exists, pass a different name")
+        for key, value in self.data.items():
+            index.add(key, value)
+        self.indexes[name] = index
+        return index
+
+    def _all_indexes(self):
+        return [self.key_index, *self.indexes.values()]
+
+    async def insert(self, key, value):
+        await asyncio.sleep(0.5)
+        # Update every index first and roll them all back if one rejects the value
+        # (e.g. a str among int ages, or an unhashable value), so data and the
+        # indexes never disagree
+        removed, added = [], []
+        try:
+            if key in self.data:
+                for index in self._all_indexes():
+                    index.remove(key, self.data[key])
+                    removed.append(index)
+            for index in self._all_indexes():
+                index.add(key, value)
+                added.append(index)
+        except Exception:
+            for index in added:
+                index.remove(key, value)
+            for index in removed:
+                index.add(key, self.data[key])
+            raise
+        self.data[key] = value
+        return f"Inserted {key}"
+
+    async def fetch_range(self, low, high, index=None):
+        # index=None ranges over the primary keys
+        await asyncio.sleep(0.3)
+        sorted_index = self.key_index if index is None else self.indexes[index]
+        return {key: self.data[key] for key in sorted_index.range(low, high)}
+
+    async def fetch_prefix(self, prefix):
+        await asyncio.sleep(0.3)
+        return {key: self.data[key] for key in self.key_index.prefix(prefix)}
+
+    async def fetch_where(self, field, field_value):
+        await asyncio.sleep(0.3)
+        return {key: self.data[key] for key in self.indexes[field].lookup(field_value)}
+
+async def example_25():
+    print("25. Secondary indexes + range queries:")
+    db = IndexedAsyncDatabase()
+    db.create_sorted_index("age")
+    db.create_hash_index("city")
+    cities = ["Dhaka", "Paris", "Tokyo"]
+    await asyncio.gather(*[
+        db.insert(f"user{i:03d}", {"age": 18 + i % 50, "city": cities[i % 3]})
+        for i in range(1000)
+    ])
+    await db.insert("user150", {"age": 99, "city": "Oslo"})  # Overwrite keeps indexes in sync
+
+    in_range = await db.fetch_range("user100", "user200")
+    print(f"   Keys user100..user200: {len(in_range)}")
+    print(f"   Keys with prefix 'user99': {list(await db.fetch_prefix('user99'))}")
+    print(f"   Age 60..99: {len(await db.fetch_range(60, 99, index='age'))} users")
+    print(f"   City == 'Oslo': {list(await db.fetch_where('city', 'Oslo'))}")
+    db.create_hash_index("age", name="age_exact")  # Second index on the same field
+    print(f"   Age == 99: {list(await db.fetch_where('age_exact', 99))}")
+    try:
+        db.create_sorted_index("city")
+    except ValueError as e:
+        print(f"   {e}")
+
+    # Full scan vs index for the same range query
+    index = db.key_index
+    start = time.perf_counter()
+    for _ in range(100):
+        [key for key in db.data if "user100" <= key <= "user200"]
+    scan = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(100):
+        index.range("user100", "user200")
+    indexed = time.perf_counter() - start
+    print(f"   100 range queries - scan: {scan * 1000:.1f}ms, index: {indexed * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    asyncio.run(example_25())
+    print()
+
+# 26. Bounded-concurrency crawler
+# gather(*[fetch_url(...)]) creates every task at once with no limit.
+# Here a fixed set of workers pull URLs from a bounded queue, with a global cap,
+# a cap per host, retries with backoff, and results streamed as they finish.
+class Crawler:
+    def __init__(self, fetch, max_concurrency=10, per_host=4, retries=2, backoff=0.05):
+        self.fetch = fetch
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self._host_limits = {}
+
+    def _host_limit(self, url):
+        host = urllib.parse.urlsplit(url).netloc or url.split("/")[0]
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _fetch_with_retries(self, url):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._host_limit(url):
+                    return await self.fetch(url)
+            except Exception:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)  # Back off without holding the host slot
+
+    async def crawl(self, urls):
+        # Yields (url, result or exception, latency) in completion order
+        todo = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        done = asyncio.Queue(maxsize=self.max_concurrency)
+
+        async def feed():
+            # Send the end markers even if iterating urls fails, or every worker
+            # would wait on todo.get() forever; the error is raised after the drain
+            error = None
+            try:
+                for url in urls:
+                    await todo.put(url)
+            except Exception as e:
+                error = e
+            for _ in range(self.max_concurrency):
+                await todo.put(None)
+            return error
+
+        async def worker():
+            while (url := await todo.get()) is not None:
+                start = time.perf_counter()
+                try:
+                    result = await self._fetch_with_retries(url)
+                except Exception as e:
+                    result = e
+                await done.put((url, result, time.perf_counter() - start))
+            await done.put(None)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks += [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+        try:
+            finished = 0
+            while finished < self.max_concurrency:
+                item = await done.get()
+                if item is None:
+                    finished += 1
+                else:
+                    yield item
+            error = await tasks[0]
+            if error is not None:
+                raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+# Local stand-in HTTP server: ~10ms per response, "/flaky" paths fail once with 503
+async def start_stand_in_server():
+    seen = set()
+
+    async def handle(reader, writer):
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        path = request_line.split()[1].decode()
+        await asyncio.sleep(0.01 + random.random() * 0.01)
+        if "flaky" in path and path not in seen:
+            seen.add(path)
+            status, body = "503 Service Unavailable", ""
+        else:
+            status, body = "200 OK", f"Content from {path}"
+        writer.write(f"HTTP/1.0 {status}\r\nContent-Length: {len(body)}\r\n\r\n{body}".encode())
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    host, port = server.sockets[0].getsockname()[:2]
+    return server, f"http://{host}:{port}"
+
+async def http_fetch(url):
+    parts = urllib.parse.urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    try:
+        writer.write(f"GET {parts.path or '/'} HTTP/1.0\r\nHost: {parts.netloc}\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if status != 200:
+        raise ConnectionError(f"{url} returned {status}")
+    return body.decode()
+
+async def example_26():
+    print("26. Bounded-concurrency crawler:")
+    crawler = Crawler(lambda url: fetch_url(url, 0.1), max_concurrency=2)
+    async for url, result, _ in crawler.crawl(["url1.com", "url2.com", "url3.com"]):
+        print(f"   Streamed: {result}")
+
+    server_a, base_a = await start_stand_in_server()
+    server_b, base_b = await start_stand_in_server()
+    try:
+        crawler = Crawler(http_fetch, max_concurrency=4, per_host=2)
+        async for url, result, _ in crawler.crawl([f"{base_a}/flaky/1", f"{base_b}/flaky/2"]):
+            print(f"   {url.split('/', 3)[3]}: {result} (succeeded on retry)")
+
+        urls = [f"{base}/page/{i}" for i in range(150) for base in (base_a, base_b)]
+        for concurrency in [5, 20, 50]:
+            crawler = Crawler(http_fetch, max_concurrency=concurrency, per_host=concurrency)
+            start = time.perf_counter()
+            latencies = [latency async for _, _, latency in crawler.crawl(urls)]
+            elapsed = time.perf_counter() - start
+            q = statistics.quantiles(latencies, n=100)
+            print(f"   concurrency={concurrency:<3} {len(urls) / elapsed:>6.0f} urls/s"
+                  f"  p50={q[49] * 1000:.1f}ms  p99={q[98] * 1000:.1f}ms")
+    finally:
+        server_a.close()
+        server_b.close()
+
+if __name__ == "__main__":
+    asyncio.run(example_26())
+    print()
+
+# 27. Backpressure-aware producer/consumer with batch dequeue
+# The queue in example 18 is unbounded, so fast producers grow memory forever.
+# A bounded queue makes put() wait when it is full (backpressure), get_batch()
+# lets consumers handle items in groups, and a pool scales consumers with depth.
+class BatchQueue(asyncio.Queue):
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.started = time.perf_counter()
+        self.items_out = 0
+        self.total_wait = 0.0  # Seconds items spent sitting in the queue
+        self.peak_depth = 0
+
+    def put_nowait(self, item):
+        super().put_nowait((time.perf_counter(), item))
+        self.peak_depth = max(self.peak_depth, self.qsize())
+
+    def get_nowait(self):
+        enqueued_at, item = super().get_nowait()
+        self.items_out += 1
+        self.total_wait += time.perf_counter() - enqueued_at
+        return item
+
+    async def get_batch(self, max_items, max_wait, idle_timeout=None):
+        # Wait for the first item, then take what else arrives within max_wait.
+        # Returns [] if nothing arrives within idle_timeout (None waits forever)
+        try:
+            batch = [await asyncio.wait_for(self.get(), idle_timeout)]
+        except asyncio.TimeoutError:
+            return []
+        deadline = time.perf_counter() + max_wait
+        while len(batch) < max_items:
+            if not self.empty():
+                batch.append(self.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "depth": self.qsize(),
+            "peak_depth": self.peak_depth,
+            "avg_wait_ms": round(self.total_wait / max(self.items_out, 1) * 1000, 2),
+            "items_per_sec": round(self.items_out / elapsed),
+        }
+
+class ConsumerPool:
+    def __init__(self, queue, handle_batch, min_consumers=1, max_consumers=8,
+                 batch_size=10, max_wait=0.05, idle_timeout=0.05):
+        self.queue = queue
+        self.handle_batch = handle_batch
+        self.min_consumers = min_consumers
+        self.max_consumers = max_consumers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.idle_timeout = idle_timeout  # How often an idle consumer checks for retirement
+        self.consumers = set()
+        self.peak_consumers = 0
+        self.failed_batches = 0
+        self._retiring = 0
+
+    def _spawn(self):
+        task = asyncio.create_task(self._consume())
+        self.consumers.add(task)
+        task.add_done_callback(self.consumers.discard)
+        self.peak_consumers = max(self.peak_consumers, len(self.consumers))
+
+    async def _consume(self):
+        while True:
+            # Retire only while holding no items, so nothing is ever dropped. An idle
+            # consumer gets here every idle_timeout instead of blocking in get() forever
+            if self._retiring:
+                self._retiring -= 1
+                return
+            batch = await self.queue.get_batch(self.batch_size, self.max_wait, self.idle_timeout)
+            if not batch:
+                continue
+            try:
+                await self.handle_batch(batch)
+            except Exception as e:
+                # Report and keep consuming; a dead consumer would stall the queue
+                self.failed_batches += 1
+                print(f"   Batch of {len(batch)} failed: {e!r}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def autoscale(self, interval=0.02):
+        while True:
+            active = len(self.consumers) - self._retiring
+            for _ in range(self.min_consumers - active):
+                self._spawn()  # Start up, and replace consumers that died
+            await asyncio.sleep(interval)
+            active = len(self.consumers) - self._retiring
+            if self.queue.qsize() > self.queue.maxsize // 2 and active < self.max_consumers:
+                self._spawn()
+            elif self.queue.empty() and active > self.min_consumers:
+                self._retiring += 1
+
+    def stop(self):
+        for task in self.consumers:
+            task.cancel()
+
+async def fast_producer(queue, id, count):
+    for i in range(count):
+        await queue.put(f"Item-{id}-{i}")  # Waits here while the queue is full
+
+async def example_27():
+    print("27. Backpressure + batch dequeue + autoscaling consumers:")
+    queue = BatchQueue(maxsize=50)
+    batch_sizes = []
+
+    async def handle_batch(batch):
+        batch_sizes.append(len(batch))
+        await asyncio.sleep(0.02)  # One round-trip per batch, not per item
+
+    pool = ConsumerPool(queue, handle_batch, min_consumers=1, max_consumers=6)
+    scaler = asyncio.create_task(pool.autoscale())
+    await asyncio.gather(*[fast_producer(queue, i, 300) for i in range(3)])
+    await queue.join()
+    scaler.cancel()
+    pool.stop()
+
+    print(f"   Batches: {len(batch_sizes)}, avg size: {sum(batch_sizes) / len(batch_sizes):.1f}")
+    print(f"   Peak consumers: {pool.peak_consumers}")
+    print(f"   Stats: {queue.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(example_27())
+    print()
+
+# 28. Process-pool offload with a shared executor
+# run_in_executor(None, ...) always uses the default thread pool, which does not
+# help CPU-bound work because of the GIL. SharedExecutor keeps one persistent
+# thread pool and one persistent process pool, and map() sends big inputs in
+# chunks so the IPC cost is paid per chunk instead of per item.
+def cpu_bound(n):
+    return sum(i * i for i in range(n))
+
+def io_bound(delay):
+    time.sleep(delay)
+    return delay
+
+def worker_pid(_):
+    return os.getpid()
+
+def _run_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+class SharedExecutor:
+    def __init__(self, processes=None, threads=None):
+        self.processes = processes or os.cpu_count()
+        self.threads = threads
+        self._thread_pool = None
+        self._process_pool = None
+
+    def _executor(self, mode):
+        # Pools are created on first use and reused for every later call
+        if mode == "thread":
+            if self._thread_pool is None:
+                self._thread_pool = concurrent.futures.ThreadPoolExecutor(self.threads)
+            return self._thread_pool
+        if mode == "process":
+            if self._process_pool is None:
+                self._process_pool = concurrent.futures.ProcessPoolExecutor(self.processes)
+            return self._process_pool
+        raise ValueError(f"Unknown mode: {mode}")
+
+    async def run(self, func, *args, mode="thread"):
+        if mode == "inline":
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(mode), func, *args)
+
+    async def map(self, func, items, mode="process", chunk_size=None):
+        items = list(items)
+        if mode == "inline":
+            return [func(item) for item in items]
+        workers = self.processes if mode == "process" else (self.threads or 8)
+        chunk_size = chunk_size or max(1, len(items) // (workers * 4))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        results = await asyncio.gather(*[self.run(_run_chunk, func, chunk, mode=mode) for chunk in chunks])
+        return [result for chunk in results for result in chunk]
+
+    def shutdown(self):
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._thread_pool = self._process_pool = None
+
+async def example_28():
+    print("28. Process-pool offload (shared executor):")
+    executor = SharedExecutor()
+    try:
+        print(f"   run(cpu_bound, mode='process'): {await executor.run(cpu_bound, 1000, mode='process')}")
+        pids = set(await executor.map(worker_pid, range(100)))
+        pids |= set(await executor.map(worker_pid, range(100)))
+        print(f"   Worker processes used across two calls: {len(pids)} (pool size {executor.processes})")
+
+        workloads = [("CPU-bound", cpu_bound, [200_000] * 16), ("I/O-bound", io_bound, [0.02] * 16)]
+        for label, func, items in workloads:
+            timings = []
+            for mode in ["inline", "thread", "process"]:
+                start = time.perf_counter()
+                await executor.map(func, items, mode=mode, chunk_size=2)
+                timings.append(f"{mode}={time.perf_counter() - start:.2f}s")
+            print(f"   {label}: {', '.join(timings)}")
+    finally:
+        executor.shutdown()
+
+# With the spawn/forkserver start methods (Windows, macOS, Linux from Python 3.14)
+# every worker re-imports this file as __mp_main__ to find cpu_bound and friends,
+# which is why every example in this file only runs under a __main__ guard
+if __name__ == "__main__":
+    asyncio.run(example_28())
+    print()
+
+# 29. Chunked + prefetching async iteration
+# AsyncRange and async_counter await once per element, so on big streams the
+# per-item context switch dominates. Chunked iterators await once per chunk,
+# and Prefetch fills the next chunk in the background while the current one is used.
+class ChunkedAsyncRange:
+    def __init__(self, start, end, chunk_size=100, delay=0.0):
+        self.current = start
+        self.end = end
+        self.chunk_size = chunk_size
+        self.delay = delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.current >= self.end:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)  # One await per chunk, not per element
+        stop = min(self.current + self.chunk_size, self.end)
+        chunk = list(range(self.current, stop))
+        self.current = stop
+        return chunk
+
+async def async_counter_chunks(max_count, chunk_size=100, delay=0.0):
+    for start in range(0, max_count, chunk_size):
+        await asyncio.sleep(delay)
+        yield list(range(start, min(start + chunk_size, max_count)))
+
+class Prefetch:
+    def __init__(self, chunks, depth=1):
+        self.chunks = chunks
+        self.depth = depth  # How many chunks may be ready ahead of the consumer
+        self._buffer = None
+        self._task = None
+        self._error = None
+
+    def __aiter__(self):
+        return self
+
+    async def _fill(self):
+        try:
+            async for chunk in self.chunks:
+                await self._buffer.put((chunk, None))
+            await self._buffer.put((None, StopAsyncIteration()))
+        except Exception as e:
+            await self._buffer.put((None, e))
+
+    async def __anext__(self):
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self._buffer = asyncio.Queue(self.depth)
+            self._task = asyncio.create_task(self._fill())
+        chunk, error = await self._buffer.get()
+        if error is not None:
+            self._error = error
+            raise error
+        return chunk
+
+    async def aclose(self):
+        # Stop the background fill (it may be stuck on a full buffer after an early
+        # break) and close the wrapped source
+        self._error = StopAsyncIteration()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.wait([self._task])
+        if hasattr(self.chunks, "aclose"):
+            await self.chunks.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+async def per_item_counter(max_count):
+    for i in range(max_count):
+        await asyncio.sleep(0)
+        yield i
+
+async def example_29():
+    print("29. Chunked + prefetching async iteration:")
+    async for chunk in ChunkedAsyncRange(0, 10, chunk_size=4):
+        print(f"   Chunk: {chunk}")
+    results = [i async for chunk in Prefetch(async_counter_chunks(10, chunk_size=4)) for i in chunk]
+    print(f"   Async comprehension: {results}")
+    async with Prefetch(async_counter_chunks(1_000, chunk_size=4)) as chunks:
+        async for chunk in chunks:
+            break  # Leaving early cancels the background fill
+    print(f"   Early exit: first chunk {chunk}, fill task done: {chunks._task.done()}")
+
+    n = 100_000
+    start = time.perf_counter()
+    total = sum([i async for i in per_item_counter(n)])
+    per_item = n / (time.perf_counter() - start)
+    start = time.perf_counter()
+    total_chunked = sum([sum(chunk) async for chunk in async_counter_chunks(n, chunk_size=1000)])
+    chunked = n / (time.perf_counter() - start)
+    assert total == total_chunked
+    print(f"   Per-item: {per_item:,.0f} items/s, chunked: {chunked:,.0f} items/s")
+
+    # Source needs 10ms per chunk, consumer works 10ms per chunk
+    for label, wrap in [("no prefetch", lambda it: it), ("prefetch", Prefetch)]:
+        start = time.perf_counter()
+        async for chunk in wrap(async_counter_chunks(5_000, chunk_size=100, delay=0.01)):
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        print(f"   {label}: {5_000 / elapsed:,.0f} items/s")
+
+if __name__ == "__main__":
+    asyncio.run(example_29())
+    print()
+
+# 30. Striped locks + sharded counter
+# Example 15 sends every update through one lock, so many tasks form a convoy.
+# A sharded counter spreads updates over N shards, each with its own lock,
+# and adds the shards up on read. Locks record wait time and contention.
+class InstrumentedLock:
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def __aenter__(self):
+        if self._lock.locked():
+            self.contended += 1
+        start = time.perf_counter()
+        await self._lock.acquire()
+        wait = time.perf_counter() - start
+        self.acquisitions += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release()
+
+class StripedLock:
+    def __init__(self, stripes=16):
+        self.locks = [InstrumentedLock() for _ in range(stripes)]
+
+    def __getitem__(self, key):
+        return self.locks[hash(key) % len(self.locks)]
+
+    def stats(self):
+        acquisitions = sum(lock.acquisitions for lock in self.locks)
+        return {
+            "acquisitions": acquisitions,
+            "contention": round(sum(lock.contended for lock in self.locks) / max(acquisitions, 1), 3),
+            "avg_wait_ms": round(sum(lock.total_wait for lock in self.locks) / max(acquisitions, 1) * 1000, 3),
+            "max_wait_ms": round(max(lock.max_wait for lock in self.locks) * 1000, 3),
+        }
+
+class ShardedCounter:
+    def __init__(self, shards=16):
+        self.shards = [0] * shards
+        self.locks = StripedLock(shards)
+
+    async def increment(self, key, amount=1, hold=0.0):
+        shard = hash(key) % len(self.shards)
+        async with self.locks.locks[shard]:
+            temp = self.shards[shard]
+            await asyncio.sleep(hold)  # Same read-await-write pattern as example 15
+            self.shards[shard] = temp + amount
+
+    @property
+    def value(self):
+        return sum(self.shards)
+
+async def example_30():
+    print("30. Striped locks + sharded counter:")
+    counter = ShardedCounter(shards=4)
+    await asyncio.gather(*[counter.increment(i) for i in range(5)])
+    print(f"   Final value: {counter.value} (shards: {counter.shards})")
+
+    # hold = time spent awaiting inside the critical section
+    runs = [(5, 0.001), (1_000, 0.001), (5, 0.0), (1_000, 0.0), (100_000, 0.0)]
+    for incrementers, hold in runs:
+        for shards in [1, 64]:
+            counter = ShardedCounter(shards)
+            start = time.perf_counter()
+            await asyncio.gather(*[counter.increment(i, hold=hold) for i in range(incrementers)])
+            elapsed = time.perf_counter() - start
+            assert counter.value == incrementers
+            stats = counter.locks.stats()
+            print(f"   {incrementers:>7} tasks, hold={hold * 1000:.0f}ms, {shards:>2} shard(s): {elapsed:.3f}s"
+                  f"  contention={stats['contention']}  avg_wait={stats['avg_wait_ms']}ms")
+
+if __name__ == "__main__":
+    asyncio.run(example_30())
+    print()
+
+# 31. Async TTL/LRU cache with stampede protection
+# fetch_data and fetch_url pay their full latency even for a repeated id or URL.
+# async_cache keeps results in an LRU with a per-entry TTL, and concurrent callers
+# for the same key share one in-flight task (single-flight) instead of stampeding.
+def async_cache(maxsize=128, ttl=60.0):
+    def decorator(func):
+        entries = collections.OrderedDict()  # key -> (expires_at, value), oldest first
+        in_flight = {}
+        stats = {"hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "expired": 0}
+
+        async def load(key, args, kwargs):
+            try:
+                value = await func(*args, **kwargs)
+                entries[key] = (asyncio.get_running_loop().time() + ttl, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+                    stats["evictions"] += 1
+                return value
+            finally:
+                del in_flight[key]
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            entry = entries.get(key)
+            if entry is not None:
+                if entry[0] > asyncio.get_running_loop().time():
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    return entry[1]
+                del entries[key]
+                stats["expired"] += 1
+            if key in in_flight:
+                stats["coalesced"] += 1
+            else:
+                stats["misses"] += 1
+                in_flight[key] = asyncio.create_task(load(key, args, kwargs))
+            # shield: one caller being cancelled must not cancel the shared load
+            return await asyncio.shield(in_flight[key])
+
+        wrapper.stats = lambda: dict(stats, size=len(entries))
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
+
+cached_fetch_data = async_cache(maxsize=2, ttl=0.5)(fetch_data)
+cached_fetch_url = async_cache(maxsize=100, ttl=60)(fetch_url)
+
+async def example_31():
+    print("31. Async TTL/LRU cache with single-flight:")
+    start = time.time()
+    results = await asyncio.gather(*[cached_fetch_url("url1.com", 1) for _ in range(5)])
+    print(f"   5 concurrent calls: {len(results)} results in {time.time() - start:.2f}s")
+    start = time.time()
+    await cached_fetch_url("url1.com", 1)
+    print(f"   Repeated call: {time.time() - start:.4f}s")
+    print(f"   fetch_url stats: {cached_fetch_url.stats()}")
+
+    for id in [1, 2, 1, 3, 1, 2]:  # maxsize=2, so 3 evicts the least recently used (2)
+        await cached_fetch_data(id, 0.1)
+    await asyncio.sleep(0.5)
+    await cached_fetch_data(1, 0.1)  # Past its TTL, so loaded again
+    print(f"   fetch_data stats: {cached_fetch_data.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(example_31())
+    print()
+
+# 32. Hedged requests + deadline propagation
+# With replicas, tail latency is set by the slowest one. A hedge sends a
+# duplicate request once the p95 latency has passed (or at once if the first one
+# failed), keeps the first successful answer and cancels the loser. One Deadline is passed down so nested
+# awaits share a single time budget instead of stacking their own timeouts.
+class Deadline:
+    def __init__(self, timeout):
+        self.expires_at = asyncio.get_running_loop().time() + timeout
+
+    def remaining(self):
+        return max(0.0, self.expires_at - asyncio.get_running_loop().time())
+
+    async def run(self, coro):
+        return await asyncio.wait_for(coro, self.remaining())
+
+class Hedger:
+    def __init__(self, percentile=95, window=200, default_delay=0.05):
+        self.percentile = percentile
+        self.latencies = collections.deque(maxlen=window)  # Recent latencies only
+        self.default_delay = default_delay
+        self.hedges_sent = 0
+
+    def hedge_delay(self):
+        if len(self.latencies) < 20:
+            return self.default_delay
+        return statistics.quantiles(self.latencies, n=100)[self.percentile - 1]
+
+    async def _timed(self, make_request):
+        start = asyncio.get_running_loop().time()
+        result = await make_request()
+        self.latencies.append(asyncio.get_running_loop().time() - start)
+        return result
+
+    async def call(self, make_request, deadline=None):
+        remaining = deadline.remaining if deadline else lambda: None
+        tasks = [asyncio.create_task(self._timed(make_request))]
+        try:
+            delay = self.hedge_delay()
+            if deadline:
+                delay = min(delay, deadline.remaining())
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if (not done or tasks[0].exception() is not None) and remaining() != 0:
+                self.hedges_sent += 1
+                tasks.append(asyncio.create_task(self._timed(make_request)))
+            while True:
+                for task in tasks:
+                    if task.done() and task.exception() is None:
+                        return task.result()
+                # A failure only counts once no other request can still succeed
+                pending = [task for task in tasks if not task.done()]
+                if not pending:
+                    raise tasks[-1].exception()
+                done, _ = await asyncio.wait(
+                    pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError("Deadline exceeded")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+def random_delay():
+    # Most calls take ~10ms, but 1 in 20 hits a slow replica and takes 200ms
+    return 0.2 if random.random() < 0.05 else random.uniform(0.005, 0.015)
+
+async def nested_fetch(id, deadline):
+    # Inner steps spend from the same budget as the caller
+    first = await deadline.run(fetch_data(id, 0.1))
+    second = await deadline.run(fetch_data(id + 1, 0.1))
+    return first, second
+
+async def example_32():
+    print("32. Hedged requests + deadline propagation:")
+    loop = asyncio.get_running_loop()
+    for hedged in [False, True]:
+        hedger = Hedger()
+        latencies = []
+        for id in range(200):
+            start = loop.time()
+            if hedged:
+                await hedger.call(lambda: fetch_data(id, random_delay()))
+            else:
+                await fetch_data(id, random_delay())
+            latencies.append(loop.time() - start)
+        q = statistics.quantiles(latencies, n=100)
+        label = f"hedged ({hedger.hedges_sent} hedges)" if hedged else "plain"
+        print(f"   {label}: p50={q[49] * 1000:.1f}ms  p99={q[98] * 1000:.1f}ms")
+
+    try:
+        await nested_fetch(1, Deadline(0.15))
+    except asyncio.TimeoutError:
+        print("   nested_fetch: 150ms deadline ran out in the second step")
+
+if __name__ == "__main__":
+    asyncio.run(example_32())
+    print()
+
+# 33. Event-loop instrumentation
+# time.time() - start only shows total wall time. LoopMonitor hooks into the
+# running loop and records task lifetimes, time callbacks sit in the ready queue,
+# callbacks that block the loop too long, and the peak number of pending tasks.
+class Histogram:
+    # Power-of-two buckets in milliseconds: <=0.125ms, <=0.25ms, ... <=1024ms, more
+    BOUNDS = [2 ** i for i in range(-3, 11)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS, ms)] += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def export(self):
+        labels = [f"<={bound}ms" for bound in self.BOUNDS] + [f">{self.BOUNDS[-1]}ms"]
+        return {label: count for label, count in zip(labels, self.counts) if count}
+
+    def summary(self):
+        count = sum(self.counts)
+        return f"n={count} avg={self.total / max(count, 1):.2f}ms max={self.max:.2f}ms"
+
+def callback_name(callback):
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        return owner.get_coro().__qualname__
+    return getattr(callback, "__qualname__", repr(callback))
+
+class LoopMonitor:
+    def __init__(self, slow_threshold=0.02):
+        self.slow_threshold = slow_threshold
+        self.task_latency = collections.defaultdict(Histogram)  # Coroutine name -> creation-to-done
+        self.ready_wait = Histogram()
+        self.callback_time = Histogram()
+        self.slow_callbacks = []
+        self.pending = 0
+        self.peak_pending = 0
+        self._loop = None
+        self._previous_factory = None
+
+    def _timed(self, loop, callback, queued_at):
+        # Ready-queue wait uses loop.time() on both ends (so it also works on a virtual
+        # clock); the callback's own run time is real CPU time, so perf_counter
+        def run(*args):
+            self.ready_wait.record(loop.time() - queued_at)
+            start = time.perf_counter()
+            try:
+                return callback(*args)
+            finally:
+                duration = time.perf_counter() - start
+                self.callback_time.record(duration)
+                if duration > self.slow_threshold:
+                    self.slow_callbacks.append((callback_name(callback), round(duration * 1000, 1)))
+        return run
+
+    def _task_factory(self, loop, coro, context=None):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        created_at = loop.time()
+        name = coro.__qualname__
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+
+        def finished(task):
+            self.pending -= 1
+            self.task_latency[name].record(loop.time() - created_at)
+        task.add_done_callback(finished)
+        return task
+
+    def install(self, loop):
+        original_call_soon = loop.call_soon
+        original_call_at = loop.call_at
+
+        def call_soon(callback, *args, context=None):
+            return original_call_soon(self._timed(loop, callback, loop.time()), *args, context=context)
+
+        def call_at(when, callback, *args, context=None):
+            # Timers count as "ready" from the moment they are due
+            queued_at = max(when, loop.time())
+            return original_call_at(when, self._timed(loop, callback, queued_at), *args, context=context)
+
+        loop.call_soon = call_soon
+        loop.call_at = call_at
+        self._previous_factory = loop.get_task_factory()
+        loop.set_task_factory(self._task_factory)
+        self._loop = loop
+
+    def uninstall(self):
+        del self._loop.call_soon
+        del self._loop.call_at
+        self._loop.set_task_factory(self._previous_factory)
+        self._previous_factory = None
+        self._loop = None
+
+    async def watch(self, coro):
+        # Usage: asyncio.run(monitor.watch(main()))
+        self.install(asyncio.get_running_loop())
+        try:
+            return await coro
+        finally:
+            self.uninstall()
+
+    def report(self):
+        print(f"   Peak pending tasks: {self.peak_pending}")
+        print(f"   Ready-queue wait: {self.ready_wait.summary()}")
+        print(f"   Callback time: {self.callback_time.summary()}")
+        for name, histogram in self.task_latency.items():
+            print(f"   Task {name}: {histogram.summary()} {histogram.export()}")
+        print(f"   Slow callbacks (>{self.slow_threshold * 1000:.0f}ms): {self.slow_callbacks}")
+
+async def blocking_handler():
+    await asyncio.sleep(0.01)
+    time.sleep(0.05)  # Blocks the whole loop - what the monitor should catch
+
+async def monitored_workload():
+    await asyncio.gather(*[fetch_data(i, random.uniform(0.01, 0.1)) for i in range(200)])
+    await asyncio.gather(*[asyncio.create_task(fetch_data(i, 0.01)) for i in range(50)], blocking_handler())
+
+async def example_33():
+    print("33. Event-loop instrumentation:")
+    monitor = LoopMonitor(slow_threshold=0.02)
+    await monitor.watch(monitored_workload())
+    monitor.report()
+
+if __name__ == "__main__":
+    asyncio.run(example_33())
+    print()
+
+# 34. Task-spawning micro-benchmark (gather vs create_task vs wait vs TaskGroup)
+# Spawns N trivial tasks with each strategy and records spawn (scheduling) time,
+# wall time and peak memory. Timings are taken with tracemalloc off, and peak memory
+# in a separate traced pass, since tracing slows the runs several times over.
+# The best run so far is saved as the baseline, and a run that is more than 50%
+# slower than it is flagged.
+async def trivial():
+    return None
+
+async def spawn_gather(n):
+    start = time.perf_counter()
+    future = asyncio.gather(*[trivial() for _ in range(n)])
+    spawned = time.perf_counter() - start
+    await future
+    return spawned
+
+async def spawn_create_task(n):
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(trivial()) for _ in range(n)]
+    spawned = time.perf_counter() - start
+    for task in tasks:
+        await task
+    return spawned
+
+async def spawn_wait(n):
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(trivial()) for _ in range(n)]
+    spawned = time.perf_counter() - start
+    await asyncio.wait(tasks)
+    return spawned
+
+async def spawn_task_group(n):
+    async with asyncio.TaskGroup() as tg:
+        start = time.perf_counter()
+        for _ in range(n):
+            tg.create_task(trivial())
+        spawned = time.perf_counter() - start
+    return spawned
+
+SPAWN_STRATEGIES = {
+    "gather": spawn_gather,
+    "create_task": spawn_create_task,
+    "wait": spawn_wait,
+    "TaskGroup": spawn_task_group,
+}
+SPAWN_BENCH_FILE = os.path.join(tempfile.gettempdir(), "spawn_bench.json")
+
+def run_spawn_bench(sizes, results_file=SPAWN_BENCH_FILE, tolerance=1.5, reset_baseline=False):
+    previous = {}
+    if os.path.exists(results_file) and not reset_baseline:
+        with open(results_file) as f:
+            previous = json.load(f)
+    for strategy in SPAWN_STRATEGIES.values():
+        asyncio.run(strategy(100))  # Warm-up, so the first strategy is not penalised
+    results = {}
+    for n in sizes:
+        for name, strategy in SPAWN_STRATEGIES.items():
+            key = f"{name}/{n}"
+            start = time.perf_counter()
+            spawned = asyncio.run(strategy(n))  # Fresh loop per run so nothing carries over
+            wall = time.perf_counter() - start
+            tracemalloc.start()
+            asyncio.run(strategy(n))  # Memory-only pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[key] = {"spawn_s": spawned, "wall_s": wall, "peak_mb": peak / 2**20}
+            flag = ""
+            # Ignore tiny absolute differences, small runs are noisy
+            if key in previous and wall > previous[key]["wall_s"] * tolerance + 0.01:
+                flag = f"  REGRESSION (was {previous[key]['wall_s']:.3f}s)"
+            print(f"   {key:<18} spawn={spawned:.3f}s  wall={wall:.3f}s  peak={peak / 2**20:.1f}MB{flag}")
+    # Only a faster run moves the baseline, so slow drift keeps getting flagged
+    baseline = dict(previous)
+    for key, result in results.items():
+        if key not in baseline or result["wall_s"] < baseline[key]["wall_s"]:
+            baseline[key] = result
+    with open(results_file, "w") as f:
+        json.dump(baseline, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    print("34. Task-spawning micro-benchmark:")
+    # Add 100_000 and 1_000_000 for the full sweep (slow, and tracemalloc needs a few GB at 1M)
+    run_spawn_bench([1_000, 10_000])
+    print(f"   Best runs kept as the baseline in {SPAWN_BENCH_FILE}")
+    print()
+
+# 35. Pooled AsyncResource
+# Every `async with AsyncResource()` spends 0.5s acquiring and 0.5s releasing.
+# ResourcePool opens resources once and hands them out again: min/max size,
+# idle eviction, a health check on checkout, and a FIFO wait queue so callers
+# are served in arrival order. Metrics report checkout wait and utilization.
+class ResourcePool:
+    def __init__(self, factory=AsyncResource, min_size=1, max_size=4,
+                 idle_timeout=30.0, health_check=None):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check or (lambda resource: True)
+        self.size = 0
+        self.in_use = 0
+        self._idle = collections.deque()     # (resource, released_at), most recent on the right
+        self._waiters = collections.deque()  # Futures, oldest caller first
+        self._closing = set()  # Close tasks for unhealthy resources, kept alive until done
+        self._reaper = None
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._busy_area = 0.0  # Integral of in_use over time, for utilization
+        self._started = self._last_change = 0.0
+
+    def _now(self):
+        return asyncio.get_running_loop().time()
+
+    def _set_in_use(self, delta):
+        now = self._now()
+        self._busy_area += self.in_use * (now - self._last_change)
+        self._last_change = now
+        self.in_use += delta
+
+    async def _open(self):
+        resource = self.factory()
+        await resource.__aenter__()
+        return resource
+
+    async def _close(self, resource):
+        await resource.__aexit__(None, None, None)
+
+    async def start(self):
+        self._started = self._last_change = self._now()
+        for _ in range(self.min_size):
+            self.size += 1
+            self._idle.append((await self._open(), self._now()))
+        self._reaper = asyncio.create_task(self._evict_idle())
+
+    async def _evict_idle(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            # Oldest idle resources sit on the left
+            while self._idle and self.size > self.min_size:
+                resource, released_at = self._idle[0]
+                if self._now() - released_at < self.idle_timeout:
+                    break
+                self._idle.popleft()
+                self.size -= 1
+                await self._close(resource)
+
+    async def acquire(self):
+        start = self._now()
+        while True:
+            if self._idle:
+                resource, _ = self._idle.pop()  # Most recently used is the warmest
+            elif self.size < self.max_size:
+                self.size += 1
+                try:
+                    resource = await self._open()
+                except BaseException:
+                    self.size -= 1
+                    self._wake_waiter()  # The slot is free again, let the next caller try
+                    raise
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    resource = await waiter
+                except asyncio.CancelledError:
+                    if not waiter.done() or waiter.cancelled():
+                        self._waiters.remove(waiter)
+                    elif waiter.result() is None:
+                        self._wake_waiter()  # Pass the free slot on
+                    else:
+                        self.release(waiter.result(), handed_off=True)
+                    raise
+                if resource is None:
+                    continue  # Woken because a slot was freed: go back and open one
+            if self.health_check(resource):
+                break
+            self.size -= 1
+            # Replace it instead of handing it out
+            task = asyncio.create_task(self._close(resource))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+        wait = self._now() - start
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._set_in_use(+1)
+        return resource
+
+    def _wake_waiter(self):
+        # None tells the waiter there is no resource, but it may open a new one
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def release(self, resource, handed_off=False):
+        if not handed_off:
+            self._set_in_use(-1)
+        # Hand straight to the longest waiter so a newcomer can't barge in
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(resource)
+                return
+        self._idle.append((resource, self._now()))
+
+    @contextlib.asynccontextmanager
+    async def checkout(self):
+        resource = await self.acquire()
+        try:
+            yield resource
+        finally:
+            self.release(resource)
+
+    async def close(self):
+        if self._reaper:
+            self._reaper.cancel()
+        while self._idle:
+            resource, _ = self._idle.popleft()
+            self.size -= 1
+            await self._close(resource)
+        await asyncio.gather(*self._closing)
+
+    def metrics(self):
+        self._set_in_use(0)
+        elapsed = max(self._now() - self._started, 1e-9)
+        return {
+            "size": self.size,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.total_wait / max(self.checkouts, 1) * 1000, 2),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "utilization": round(self._busy_area / (elapsed * self.max_size), 2),
+        }
+
+async def example_35():
+    print("35. Pooled AsyncResource:")
+    pool = ResourcePool(min_size=1, max_size=3, idle_timeout=0.2,
+                        health_check=lambda resource: not getattr(resource, "broken", False))
+    await pool.start()
+
+    async def worker(id):
+        for i in range(5):
+            async with pool.checkout() as resource:
+                await asyncio.sleep(0.01)  # Short critical section
+                if id == 0 and i == 0:
+                    resource.broken = True  # Dropped on its next checkout
+
+    start = time.time()
+    await asyncio.gather(*[worker(id) for id in range(10)])
+    print(f"   50 checkouts in {time.time() - start:.2f}s (vs ~50s acquiring/releasing each time)")
+    print(f"   Metrics: {pool.metrics()}")
+    await asyncio.sleep(1.5)
+    print(f"   Size after idle eviction: {pool.size} (min_size={pool.min_size})")
+    await pool.close()
+
+if __name__ == "__main__":
+    asyncio.run(example_35())
+    print()
+
+# 36. Write-ahead log with group commit
+# AsyncDatabase lives only in memory. DurableAsyncDatabase appends every insert
+# to a log file (JSON lines, so values must be JSON-serializable) and replays it
+# on connect(). Inserts that arrive while a write is in progress are grouped
+# into the next single write + fsync, and all disk I/O runs off the event loop.
+class DurableAsyncDatabase(AsyncDatabase):
+    def __init__(self, path, group_commit=True):
+        super().__init__()
+        self.path = path
+        self.group_commit = group_commit
+        self.fsyncs = 0
+        self._file = None
+        self._pending = []  # (key, value, line, future) waiting for the next commit
+        self._flusher = None
+        self._io_lock = asyncio.Lock()
+
+    async def connect(self):
+        self.data = await asyncio.to_thread(self._replay)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _replay(self):
+        data = {}
+        if not os.path.exists(self.path):
+            return data
+        good = 0  # Byte offset just past the last complete record
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write at the tail from a crash
+                try:
+                    record = json.loads(line)
+                except (UnicodeDecodeError, json.JSONDecodeError):
+                    break
+                data[record["k"]] = record["v"]
+                good += len(line)
+        # Cut off the torn tail, or the next append would be glued onto it and
+        # every later replay would stop there and lose it
+        if good < os.path.getsize(self.path):
+            os.truncate(self.path, good)
+        return data
+
+    def _write(self, lines):
+        self._file.write("".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _commit(self, batch):
+        # data only changes after the log is on disk, under the same lock as compaction
+        async with self._io_lock:
+            await asyncio.to_thread(self._write, [line for _, _, line, _ in batch])
+            self.fsyncs += 1
+            for key, value, _, _ in batch:
+                self.data[key] = value
+
+    async def _flush(self):
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def insert(self, key, value):
+        line = json.dumps({"k": key, "v": value}) + "\n"
+        if not self.group_commit:
+            await self._commit([(key, value, line, None)])
+            return f"Inserted {key}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, value, line, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        await future
+        return f"Inserted {key}"
+
+    def _rewrite(self, snapshot):
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, value in snapshot.items():
+                f.write(json.dumps({"k": key, "v": value}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)  # Atomic, so a crash leaves either the old or the new log
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    async def compact(self):
+        # Keep only the latest value per key
+        async with self._io_lock:
+            await asyncio.to_thread(self._rewrite, dict(self.data))
+
+    async def close(self):
+        if self._flusher is not None:
+            await self._flusher
+        self._file.close()
+
+async def example_36():
+    print("36. Write-ahead log with group commit:")
+    with tempfile.TemporaryDirectory() as tmp:
+        for group_commit, n in [(False, 200), (True, 2000)]:
+            db = DurableAsyncDatabase(os.path.join(tmp, f"wal-{group_commit}.log"), group_commit)
+            await db.connect()
+            start = time.perf_counter()
+            await asyncio.gather(*[db.insert(f"user{i}", {"n": i}) for i in range(n)])
+            elapsed = time.perf_counter() - start
+            await db.close()
+            label = "group commit" if group_commit else "fsync per insert"
+            print(f"   {label}: {n / elapsed:,.0f} inserts/s, {db.fsyncs} fsyncs for {n} inserts")
+
+        path = os.path.join(tmp, "wal-True.log")
+        db = DurableAsyncDatabase(path)
+        await db.connect()  # "Restart": rebuild data from the log
+        print(f"   Replayed {len(db.data)} keys, user42 = {await db.fetch('user42')}")
+        await asyncio.gather(*[db.insert(f"user{i}", {"n": -i}) for i in range(1000)])
+        with open(path) as f:
+            before = sum(1 for _ in f)
+        await db.compact()
+        with open(path) as f:
+            after = sum(1 for _ in f)
+        await db.close()
+        print(f"   Compaction: {before} log lines -> {after}")
+
+if __name__ == "__main__":
+    asyncio.run(example_36())
+    print()
+
+# 37. Token-bucket rate limiter
+# The Semaphore in example 16 limits how many tasks run at once, not how many
+# requests per second go out. A token bucket refills at `rate` tokens/s up to
+# `capacity` (the burst). Each caller reserves its tokens up front, even if the
+# balance goes negative, and sleeps exactly until its share has refilled, so
+# waiters are served in order and nobody polls.
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = None
+
+    async def acquire(self, weight=1):
+        if weight > self.capacity:
+            raise ValueError(f"weight {weight} exceeds bucket capacity {self.capacity}")
+        now = asyncio.get_running_loop().time()
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= weight
+        if self.tokens < 0:
+            try:
+                await asyncio.sleep(-self.tokens / self.rate)
+            except asyncio.CancelledError:
+                self.tokens += weight  # Give back the reservation
+                raise
+
+class KeyedRateLimiter:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+
+    async def acquire(self, key, weight=1):
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(self.rate, self.capacity)
+        await self.buckets[key].acquire(weight)
+
+async def rate_limited_task(sem, bucket, id, start):
+    async with sem:
+        await bucket.acquire()
+        loop = asyncio.get_running_loop()
+        print(f"   Task {id} running at {loop.time() - start:.2f}s")
+        await asyncio.sleep(0.05)
+
+async def example_37():
+    print("37. Token-bucket rate limiter:")
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(2)  # Still at most 2 at once...
+    bucket = TokenBucket(rate=5, capacity=1)  # ...and at most 5 per second
+    start = loop.time()
+    await asyncio.gather(*[rate_limited_task(sem, bucket, i, start) for i in range(5)])
+
+    limiter = KeyedRateLimiter(rate=20, capacity=5)
+    start = loop.time()
+    await asyncio.gather(
+        *[limiter.acquire("search", weight=5) for _ in range(4)],  # Expensive calls
+        *[limiter.acquire("profile") for _ in range(20)],
+    )
+    print(f"   Weighted + per-key buckets done in {loop.time() - start:.2f}s (~0.75s expected)")
+
+    target, waiters = 5_000, 10_000
+    bucket = TokenBucket(rate=target, capacity=100)
+    done_at = []
+
+    async def waiter():
+        await bucket.acquire()
+        done_at.append(loop.time())
+
+    start = loop.time()
+    await asyncio.gather(*[waiter() for _ in range(waiters)])
+    elapsed = loop.time() - start
+    windows = collections.Counter(int((t - start) / 0.1) for t in done_at)
+    steady = [count * 10 for window, count in windows.items() if 0 < window < max(windows)]
+    print(f"   {waiters} waiters, target {target}/s: overall {(waiters - 100) / elapsed:,.0f}/s"
+          f" after the burst, 100ms windows {min(steady):,}-{max(steady):,}/s")
+
+if __name__ == "__main__":
+    asyncio.run(example_37())
+    print()
+
+# 38. Deadline-aware priority scheduler
+# Everything above runs first-come-first-served. DeadlineScheduler keeps jobs in
+# an asyncio.PriorityQueue ordered by (deadline, priority), so the earliest
+# deadline runs first (EDF), drops jobs whose deadline passed before they started,
+# and counts on-time / late / dropped jobs per priority.
+class DeadlineScheduler:
+    def __init__(self, workers=4, policy="edf"):
+        self.workers = workers
+        self.policy = policy  # "edf", or "fifo" for comparison
+        self.queue = asyncio.PriorityQueue()
+        self.stats = collections.defaultdict(collections.Counter)  # priority -> outcome counts
+        self._seq = itertools.count()
+        self._tasks = []
+
+    def submit(self, func, *args, deadline=None, priority=0):
+        # Takes the coroutine function, so a dropped job never creates a coroutine
+        loop = asyncio.get_running_loop()
+        due = loop.time() + deadline if deadline is not None else float("inf")
+        seq = next(self._seq)
+        key = (due, priority, seq) if self.policy == "edf" else (seq,)
+        future = loop.create_future()
+        self.queue.put_nowait((key, (due, priority, func, args, future)))
+        return future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, (due, priority, func, args, future) = await self.queue.get()
+            try:
+                if future.done():  # Cancelled by the caller while queued
+                    self.stats[priority]["cancelled"] += 1
+                    continue
+                if loop.time() > due:
+                    self.stats[priority]["dropped"] += 1
+                    future.set_exception(asyncio.TimeoutError("Deadline passed before start"))
+                    continue
+                try:
+                    result = await func(*args)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    if asyncio.current_task().cancelling():
+                        raise  # The worker itself is being stopped
+                    # Only the job was cancelled (e.g. it awaited a cancelled future)
+                    self.stats[priority]["cancelled"] += 1
+                    continue
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    # The caller may have cancelled while the job ran
+                    if not future.done():
+                        future.set_result(result)
+                self.stats[priority]["late" if loop.time() > due else "on_time"] += 1
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def join(self):
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+
+    def miss_rate(self, priority):
+        counts = self.stats[priority]
+        total = sum(counts.values()) - counts["cancelled"]
+        return (counts["late"] + counts["dropped"]) / max(total, 1)
+
+async def example_38():
+    print("38. Deadline-aware priority scheduler:")
+    for policy in ["fifo", "edf"]:
+        scheduler = DeadlineScheduler(workers=3, policy=policy)
+        scheduler.start()
+        # Batch work floods the queue first: 60 x 50ms on 3 workers is ~1s of backlog
+        futures = [scheduler.submit(fetch_data, i, 0.05, priority=1) for i in range(60)]
+        # Latency-sensitive calls arrive every 20ms with a 100ms SLO
+        for i in range(40):
+            futures.append(scheduler.submit(fetch_data, i, 0.01, deadline=0.1, priority=0))
+            await asyncio.sleep(0.02)
+        await scheduler.join()
+        await asyncio.gather(*futures, return_exceptions=True)
+        print(f"   {policy}: latency miss rate {scheduler.miss_rate(0):.0%} {dict(scheduler.stats[0])},"
+              f" batch completed {scheduler.stats[1]['on_time']}")
+
+if __name__ == "__main__":
+    asyncio.run(example_38())
+    print()
+
+# 39. Streaming results as tasks complete
+# gather() returns only when the slowest task is done. stream_results yields
+# (index, result or exception) as each task finishes, so downstream work starts
+# on the first result. ordered=True yields in input order instead; `window`
+# caps tasks in flight plus results held for reordering, which bounds memory.
+async def stream_results(aws, ordered=False, window=None):
+    pending = iter(enumerate(aws))  # Consumed lazily, so it can be a generator
+    in_flight = {}  # task -> index
+    buffered = {}   # index -> outcome, waiting for earlier indexes (ordered mode)
+    next_index = 0
+
+    def launch():
+        while window is None or len(in_flight) + len(buffered) < window:
+            try:
+                index, aw = next(pending)
+            except StopIteration:
+                return
+            in_flight[asyncio.ensure_future(aw)] = index
+
+    try:
+        if window is not None and window < 1:
+            raise ValueError("window must be at least 1")
+        launch()
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=in_flight.get):
+                index = in_flight.pop(task)
+                if task.cancelled():
+                    outcome = asyncio.CancelledError()  # As gather(return_exceptions=True)
+                elif task.exception() is not None:
+                    outcome = task.exception()
+                else:
+                    outcome = task.result()
+                if ordered:
+                    buffered[index] = outcome
+                else:
+                    yield index, outcome
+            while next_index in buffered:
+                yield next_index, buffered.pop(next_index)
+                next_index += 1
+            launch()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        # On early exit, close coroutines from a list that were never started so they
+        # don't warn "never awaited". An iterator's are not created yet, leave it alone
+        if not isinstance(aws, collections.abc.Iterator):
+            for _, aw in pending:
+                if inspect.iscoroutine(aw):
+                    aw.close()
+
+async def example_39():
+    print("39. Streaming results (as_completed style):")
+    start = time.time()
+    async for i, result in stream_results([task_that_succeeds(), task_that_fails()]):
+        kind = "Exception - " if isinstance(result, Exception) else ""
+        print(f"   Task {i}: {kind}{result} at {time.time() - start:.2f}s")
+
+    urls = [("url1.com", 0.2), ("url2.com", 0.4), ("url3.com", 0.1), ("url4.com", 0.3)]
+    start = time.time()
+    async for i, content in stream_results(fetch_url(url, delay) for url, delay in urls):
+        print(f"   Unordered #{i}: {content} at {time.time() - start:.2f}s")
+    start = time.time()
+    async for i, content in stream_results((fetch_url(url, delay) for url, delay in urls),
+                                           ordered=True, window=2):
+        print(f"   Ordered #{i}: {content} at {time.time() - start:.2f}s")
+
+if __name__ == "__main__":
+    asyncio.run(example_39())
+    print()
+
+# 40. One event loop per core (multi-process sharding)
+# A single asyncio.run loop uses one core, so CPU work between awaits caps
+# throughput. ShardedLoopRunner starts one worker process per core, each running
+# its own event loop. Jobs are routed by a stable hash of their key, so the same
+# key always lands on the same loop, and results are collected in the parent.
+# The worker processes live in a SharedExecutor (example 28) and are reused by
+# every run() until close().
+async def mixed_handler(key, delay, work):
+    await fetch_data(key, delay)  # I/O part
+    return key, cpu_bound(work)   # CPU part between awaits
+
+async def _run_shard(jobs, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(job_id, func, args):
+        async with sem:
+            try:
+                return job_id, await func(*args), None
+            except Exception as e:
+                return job_id, None, e
+
+    return await asyncio.gather(*[run(*job) for job in jobs])
+
+def _shard_main(jobs, concurrency):
+    return asyncio.run(_run_shard(jobs, concurrency))
+
+class ShardedLoopRunner:
+    def __init__(self, processes=None, concurrency=100):
+        self.processes = processes or os.cpu_count()
+        self.concurrency = concurrency  # Max coroutines in flight per shard
+        self.executor = SharedExecutor(processes=self.processes)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def shard_for(self, key):
+        # hash() of str is randomized per process, so use a stable hash
+        return zlib.crc32(repr(key).encode()) % self.processes
+
+    async def run(self, jobs):
+        # jobs: list of (key, coroutine_function, args). Returns results in input order,
+        # with exceptions in place of results for failed jobs.
+        shards = [[] for _ in range(self.processes)]
+        for job_id, (key, func, args) in enumerate(jobs):
+            shards[self.shard_for(key)].append((job_id, func, args))
+        shard_results = await asyncio.gather(*[
+            self.executor.run(_shard_main, shard, self.concurrency, mode="process")
+            for shard in shards if shard
+        ])
+        results = [None] * len(jobs)
+        for shard in shard_results:
+            for job_id, result, error in shard:
+                results[job_id] = error if error is not None else result
+        return results
+
+async def example_40():
+    print("40. One event loop per core (sharded by key):")
+    jobs = [(f"user{i}", mixed_handler, (i, 0.01, 20_000)) for i in range(400)]
+    cores = os.cpu_count()
+    for processes in sorted({1, max(1, cores // 2), cores}):
+        runner = ShardedLoopRunner(processes)
+        try:
+            await runner.run(jobs)  # Warm-up: starts the worker processes
+            start = time.perf_counter()
+            results = await runner.run(jobs)
+            elapsed = time.perf_counter() - start
+        finally:
+            runner.close()
+        print(f"   {processes} loop(s): {len(results) / elapsed:,.0f} jobs/s")
+    print(f"   user7 -> shard {runner.shard_for('user7')}, result key: {results[7][0]}")
+
+# The shard workers re-import this file too (see example 28); _shard_main and
+# mixed_handler are module-level so they pickle by name, and the guard below
+# (like every other example's) keeps the workers from running the examples
+if __name__ == "__main__":
+    asyncio.run(example_40())
+    print()
+
+# 41. Async streaming pipeline
+# Chains source -> map_concurrent -> filter -> batch -> sink. Each stage runs its
+# own worker tasks, stages are joined by bounded queues (so no stage ever holds
+# the whole stream), and each stage records its throughput and latency.
+_END = object()
+
+async def _maybe_await(value):
+    return await value if inspect.isawaitable(value) else value
+
+class StageMetrics:
+    def __init__(self):
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0  # Seconds spent inside the stage function
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return (f"in={self.items_in:<5} out={self.items_out:<5} "
+                f"{self.items_in / max(elapsed, 1e-9):>8,.0f} items/s  "
+                f"avg latency={self.busy / max(self.items_in, 1) * 1000:.2f}ms")
+
+class Pipeline:
+    def __init__(self, source, buffer_size=100):
+        self.source = source  # Any iterable or async iterable
+        self.buffer_size = buffer_size
+        self.stages = []      # (name, handle, flush, concurrency)
+        self.metrics = {}
+
+    def _add(self, kind, handle, flush=None, concurrency=1):
+        self.stages.append((f"{len(self.stages) + 1}.{kind}", handle, flush, concurrency))
+        return self
+
+    def map_concurrent(self, fn, n=1):
+        async def handle(item):
+            return [await _maybe_await(fn(item))]
+        return self._add("map", handle, concurrency=n)
+
+    def filter(self, predicate, n=1):
+        async def handle(item):
+            return [item] if await _maybe_await(predicate(item)) else []
+        return self._add("filter", handle, concurrency=n)
+
+    def batch(self, size):
+        pending = []
+
+        async def handle(item):
+            pending.append(item)
+            if len(pending) < size:
+                return []
+            full = pending[:]
+            pending.clear()
+            return [full]
+
+        async def flush():
+            return [pending[:]] if pending else []
+        return self._add("batch", handle, flush)  # Stateful, so always one worker
+
+    def sink(self, fn, n=1):
+        async def handle(item):
+            await _maybe_await(fn(item))
+            return []
+        return self._add("sink", handle, concurrency=n)
+
+    async def _feed(self, outbox):
+        metrics = self.metrics["0.source"] = StageMetrics()
+        if hasattr(self.source, "__aiter__"):
+            async for item in self.source:
+                metrics.items_in += 1
+                await outbox.put(item)
+        else:
+            for item in self.source:
+                metrics.items_in += 1
+                await outbox.put(item)
+        metrics.items_out = metrics.items_in
+        metrics.finished = time.perf_counter()
+        await outbox.put(_END)
+
+    async def _run_stage(self, name, handle, flush, concurrency, inbox, outbox):
+        metrics = self.metrics[name] = StageMetrics()
+        remaining = concurrency
+
+        async def emit(results):
+            for result in results:
+                metrics.items_out += 1
+                if outbox is not None:
+                    await outbox.put(result)  # Waits while the next stage is behind
+
+        async def worker():
+            nonlocal remaining
+            while (item := await inbox.get()) is not _END:
+                metrics.items_in += 1
+                start = time.perf_counter()
+                results = await handle(item)
+                metrics.busy += time.perf_counter() - start
+                await emit(results)
+            await inbox.put(_END)  # Let sibling workers see the end too
+            remaining -= 1
+            if remaining == 0:
+                if flush is not None:
+                    await emit(await flush())
+                metrics.finished = time.perf_counter()
+                if outbox is not None:
+                    await outbox.put(_END)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    async def run(self):
+        queues = [asyncio.Queue(self.buffer_size) for _ in self.stages]
+        async with asyncio.TaskGroup() as tg:  # One failing stage cancels the rest
+            tg.create_task(self._feed(queues[0]))
+            for i, (name, handle, flush, concurrency) in enumerate(self.stages):
+                outbox = queues[i + 1] if i + 1 < len(queues) else None
+                tg.create_task(self._run_stage(name, handle, flush, concurrency, queues[i], outbox))
+        return self.metrics
+
+async def example_41():
+    print("41. Async streaming pipeline:")
+    batches = []
+    await (Pipeline(async_counter(5))
+           .map_concurrent(lambda i: i * 10)
+           .sink(lambda value: print(f"   Sink got: {value}"))
+           .run())
+
+    pipeline = (Pipeline(range(2_000), buffer_size=50)
+                .map_concurrent(lambda i: fetch_data(i, 0.01), n=50)  # I/O stage, 50 at once
+                .filter(lambda data: int(data.split()[1]) % 3 == 0)
+                .batch(100)
+                .sink(batches.append))
+    start = time.perf_counter()
+    metrics = await pipeline.run()
+    print(f"   Ingested {sum(map(len, batches))} items in {len(batches)} batches"
+          f" in {time.perf_counter() - start:.2f}s")
+    for name, stage in metrics.items():
+        print(f"   {name:<10} {stage.summary()}")
+
+if __name__ == "__main__":
+    asyncio.run(example_41())
+    print()
+
+# 42. Binary snapshot + memory-mapped warm restart
+# Rebuilding a big data dict at startup means deserializing every value first.
+# The snapshot format is a sorted table of fixed-size entries followed by the key and value
+# bytes. Loading only mmaps the file: lookups binary-search the table and decode
+# just the one value they need. Writes after loading go to an in-memory overlay.
+#
+# Layout: b"ADBSNAP1" | count (u64) | count x (key_off u64, key_len u32, val_off u64, val_len u32) | blobs
+SNAPSHOT_MAGIC = b"ADBSNAP1"
+SNAPSHOT_HEADER = struct.Struct("<8sQ")
+SNAPSHOT_ENTRY = struct.Struct("<QIQI")
+
+def write_snapshot(data, path):
+    # Keys must be str and values JSON-serializable (same rule as the WAL in example 36)
+    items = sorted((key.encode(), json.dumps(value).encode()) for key, value in data.items())
+    offset = SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size * len(items)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(items)))
+        for key, value in items:
+            f.write(SNAPSHOT_ENTRY.pack(offset, len(key), offset + len(key), len(value)))
+            offset += len(key) + len(value)
+        for key, value in items:
+            f.write(key)
+            f.write(value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class SnapshotData(collections.abc.MutableMapping):
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = SNAPSHOT_HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        self._overlay = {}     # Keys written since loading
+        self._deleted = set()  # Snapshot keys deleted since loading
+        self._extra = 0        # Keys added minus keys deleted, for O(1) len()
+
+    def _entry(self, i):
+        return SNAPSHOT_ENTRY.unpack_from(self._map, SNAPSHOT_HEADER.size + i * SNAPSHOT_ENTRY.size)
+
+    def _key_at(self, i):
+        key_off, key_len, _, _ = self._entry(i)
+        return self._map[key_off:key_off + key_len]
+
+    def _find(self, key):
+        # Binary search over the sorted table: O(log n), nothing decoded on the way
+        target = key.encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key_at(lo) == target:
+            return lo
+        return None
+
+    def __contains__(self, key):
+        if key in self._overlay:
+            return True
+        return key not in self._deleted and self._find(key) is not None
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        i = None if key in self._deleted else self._find(key)
+        if i is None:
+            raise KeyError(key)
+        _, _, val_off, val_len = self._entry(i)
+        return json.loads(self._map[val_off:val_off + val_len])
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._extra += 1
+        self._deleted.discard(key)
+        self._overlay[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if self._find(key) is not None:
+            self._deleted.add(key)
+        self._extra -= 1
+
+    def __iter__(self):
+        for i in range(self._count):
+            key = self._key_at(i).decode()
+            if key not in self._deleted and key not in self._overlay:
+                yield key
+        yield from self._overlay
+
+    def __len__(self):
+        return self._count + self._extra
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+class SnapshotAsyncDatabase(AsyncDatabase):
+    async def save_snapshot(self, path):
+        await asyncio.to_thread(write_snapshot, dict(self.data), path)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        db = cls()
+        db.data = SnapshotData(path)
+        return db
+
+async def example_42():
+    print("42. Binary snapshot + mmap warm restart:")
+    n = 200_000  # Raise to 1M-10M for the full comparison
+    db = SnapshotAsyncDatabase()
+    db.data = {f"user{i}": {"name": f"Name {i}", "score": i % 100} for i in range(n)}
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "db.snap")
+        await db.save_snapshot(snapshot_path)
+        with open(os.path.join(tmp, "db.json"), "w") as f:
+            json.dump(db.data, f)
+        with open(os.path.join(tmp, "db.pickle"), "wb") as f:
+            pickle.dump(db.data, f)
+
+        start = time.perf_counter()
+        with open(os.path.join(tmp, "db.json")) as f:
+            json.load(f)
+        print(f"   {n:,} keys - JSON load: {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        with open(os.path.join(tmp, "db.pickle"), "rb") as f:
+            pickle.load(f)
+        print(f"   {n:,} keys - pickle load: {time.perf_counter() - start:.3f}s")
+        start = time.perf_counter()
+        restarted = SnapshotAsyncDatabase.load_snapshot(snapshot_path)
+        loaded = time.perf_counter() - start
+        first = restarted.data["user12345"]
+        print(f"   {n:,} keys - snapshot mmap: {loaded * 1000:.2f}ms,"
+              f" first lookup {(time.perf_counter() - start - loaded) * 1000:.3f}ms")
+
+        await restarted.insert("user12345", {"name": "Updated", "score": 1})
+        await restarted.insert("new_user", {"name": "New", "score": 2})
+        print(f"   Before: {first}, after insert: {await restarted.fetch('user12345')}")
+        print(f"   len(): {len(restarted.data):,}")
+        restarted.data.close()
+
+if __name__ == "__main__":
+    asyncio.run(example_42())
+    print()
+
+# 43. Virtual-time event loop
+# VirtualClockLoop (defined at the top of this file) jumps the clock forward
+# whenever every task is waiting on a timer. Sleeps, wait_for timeouts and
+# cancellations happen in the same order as in real time, just without the wait.
+# Threads, processes and sockets are still waited on in real time.
+async def virtual_time_demo():
+    loop = asyncio.get_running_loop()
+    order = []
+
+    async def sleeper(name, delay):
+        await asyncio.sleep(delay)
+        order.append((name, loop.time()))
+
+    await asyncio.gather(sleeper("hour", 3600), sleeper("second", 1), sleeper("minute", 60))
+    try:
+        await asyncio.wait_for(long_task(), timeout=1.0)  # Example 13
+    except asyncio.TimeoutError:
+        order.append(("wait_for timeout", loop.time()))
+    task = asyncio.create_task(asyncio.sleep(5))  # Example 14
+    await asyncio.sleep(1)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    order.append(("cancelled", loop.time()))
+    await asyncio.wait_for(asyncio.to_thread(time.sleep, 0.2), timeout=5)  # Real 0.2s
+    order.append(("to_thread done", loop.time()))
+    return order
+
+def run_virtual(coro):
+    with asyncio.Runner(loop_factory=VirtualClockLoop) as runner:
+        return runner.run(coro)
+
+if __name__ == "__main__":
+    print("43. Virtual-time event loop:")
+    start = time.perf_counter()
+    for name, at in run_virtual(virtual_time_demo()):
+        print(f"   {name:<16} at virtual t={at:.1f}s")
+    print(f"   ~1h of virtual sleeps took {(time.perf_counter() - start) * 1000:.1f}ms real time")
+    start = time.perf_counter()
+    run_virtual(example_8())  # Same pattern as practice.py's async_counter
+    print(f"   Example 8 took {(time.perf_counter() - start) * 1000:.1f}ms real time")
+    print()
+
+if __name__ == "__main__":
+    print("="*60)
+    print("END OF ASYNC PROGRAMMING CONCEPTS")
+    print("="*60)
\ No newline at end of file